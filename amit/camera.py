@@ -149,11 +149,7 @@ class Camera:
         for frame in frames:
             frame = temp_filter.process(frame)
 
-        filters = utils.get_filters(self.filters)
-        for fil in filters:
-            frame = fil.process(frame)
-
-        return frame
+        return utils.apply_filters(frame, utils.get_filters(self.filters))
 
     def generate_adapted_point_cloud(self: 'Camera', number_of_frames: int = 1,
                                      number_of_dummy_frames: int = 0, filter_predicate=lambda p: False) -> np.ndarray:
@@ -178,18 +174,15 @@ class Camera:
         :return: The point cloud generated after all the calculations
         """
         frame = self.apply_filters(frames)
-        pc: rs2.pointcloud = rs2.pointcloud()
-        points: np.ndarray = np.array(pc.calculate(frame).get_vertices())
+        points: np.ndarray = utils.calculate_points(frame)
 
-        # Convert to viable np.ndarray, and also filter 'zero' points and accounts for deviation
-        points = np.array([(x + self.dx, y + self.dy, z + self.dz) for (x, y, z) in points if not x == y == z == 0])
+        # Filter 'zero' points and accounts for deviation
+        points = points[np.any(points != 0, axis=1)]
+        points += (self.dx, self.dy, self.dz)
 
         # Invert x, y axis and mirror the z axis around the distance line
-        utils.change_coordinates_inplace(points,
-                                         lambda p: (-p[0], -p[1], self.distance - p[2]))
+        utils.invert_and_shift_z(points, self.distance)
 
-        from math import atan
-        points = utils.filter_points(points, lambda p: not -60 < atan(p[2] / p[0]) < 60)
         # points = utils.filter_points(points, filter_predicate)
         utils.rotate_point_cloud_inplace(points, self.angle)
         return points
@@ -213,9 +206,8 @@ class Camera:
         config = self.get_config()
         frames = Camera.capture_frames(config, number_of_frames, number_of_dummy_frames)
         frame = self.apply_filters(frames)
-        pc = rs2.pointcloud()
-        points = np.array(pc.calculate(frame).get_vertices())
-        points = np.array([(x, y, z) for (x, y, z) in points if not x == y == z == 0])
+        points = utils.calculate_points(frame)
+        points = points[np.any(points != 0, axis=1)]
         diffs = deviations.calculate_pc_deviations_by_pcV2(points)
 
         return diffs[0], diffs[1], diffs[2] + surface_radius - self.distance
@@ -5,6 +5,7 @@ from typing import List, Dict, Any, TextIO, Tuple
 import numpy as np
 import pyrealsense2 as rs2
 
+from amit import utils
 from amit.camera import Camera, CameraType
 
 
@@ -18,6 +19,7 @@ class Data:
         self.number_of_dummy_frames: int = 0
         self.filename: str = ''
         self.max_workers: int = 0
+        self.voxel_size: float = 0
         self.calibration_surface: Tuple[float, float, float] = (0, 0, 0)
         self.debug: bool = False
 
@@ -56,6 +58,7 @@ class Data:
             data_dict['number_of_dummy_frames']
         data.filename = 'default.stl' if 'filename' not in data_dict else data_dict['filename']
         data.max_workers = 1 if 'max_workers' not in data_dict else data_dict['max_workers']
+        data.voxel_size = utils.DEFAULT_VOXEL_SIZE if 'voxel_size' not in data_dict else data_dict['voxel_size']
         data.calibration_surface = (0, 0, 0) if 'calibration_surface' not in data_dict else data_dict[
             'calibration_surface']
         data.debug = False if 'debug' not in data_dict else data_dict['debug']
@@ -80,8 +83,8 @@ class Data:
         :return: A dictionary representing the data
         """
         data_dict = {'number_of_frames': self.number_of_frames, 'number_of_dummy_frames': self.number_of_dummy_frames,
-                     'filename': self.filename, 'max_workers': self.max_workers, 'debug': self.debug,
-                     'calibration_surface': self.calibration_surface, 'cameras': []}
+                     'filename': self.filename, 'max_workers': self.max_workers, 'voxel_size': self.voxel_size,
+                     'debug': self.debug, 'calibration_surface': self.calibration_surface, 'cameras': []}
         for cam in self.cameras:
             data_dict['cameras'].append(cam.to_dict())
 
@@ -21,14 +21,15 @@ def calculate_pc_deviations_by_pc(object_pc: np.ndarray, captured_pc: np.ndarray
     assert object_pc.shape[1] == 3
     assert captured_pc.shape[1] == 3
 
-    mins_obj = np.min(object_pc, axis=0)
-    mins_cap = np.min(captured_pc, axis=0)
-    maxs_obj = np.max(object_pc, axis=0)
-    maxs_cap = np.max(captured_pc, axis=0)
+    # Only reduce the columns that are actually used: min x, max x, max y and mean z
+    min_x_obj = np.min(object_pc[:, 0])
+    min_x_cap = np.min(captured_pc[:, 0])
+    maxs_obj = np.max(object_pc[:, :2], axis=0)
+    maxs_cap = np.max(captured_pc[:, :2], axis=0)
 
-    x_shift = ((maxs_obj[0] - maxs_cap[0]) + (mins_obj[0] - mins_cap[0])) / 2
+    x_shift = ((maxs_obj[0] - maxs_cap[0]) + (min_x_obj - min_x_cap)) / 2
     y_shift = (maxs_obj[1] - maxs_cap[1])
-    z_shift = np.average(object_pc, axis=0)[2] - np.average(captured_pc, axis=0)[2]
+    z_shift = np.mean(object_pc[:, 2]) - np.mean(captured_pc[:, 2])
 
     return x_shift, y_shift, z_shift
 
@@ -56,18 +57,43 @@ def calculate_pc_deviations_by_frame(object_frame: np.ndarray, captured_frame: n
     assert len(object_frame.shape) == 2
     assert len(captured_frame.shape) == 2
 
-    x_shift = ((find_edge_mean(object_frame, 'right', intrinsics)
-                - find_edge_mean(captured_frame, 'right', intrinsics))
-               + (find_edge_mean(object_frame, 'left', intrinsics)
-                  - find_edge_mean(captured_frame, 'left', intrinsics))) / 2
+    obj_right, obj_left, obj_up, _ = edge_means(object_frame, intrinsics)
+    cap_right, cap_left, cap_up, _ = edge_means(captured_frame, intrinsics)
 
-    y_shift = (find_edge_mean(object_frame, 'up', intrinsics) - find_edge_mean(captured_frame, 'up', intrinsics))
+    x_shift = ((obj_right - cap_right) + (obj_left - cap_left)) / 2
+
+    y_shift = (obj_up - cap_up)
 
     z_shift = average_z_frame(object_frame, shape) - average_z_frame(captured_frame, shape)
 
     return x_shift, y_shift, z_shift
 
 
+@functools.lru_cache(maxsize=None)
+def _deprojection_coords(fx: float, fy: float, ppx: float, ppy: float, width: int,
+                         height: int) -> Tuple[np.ndarray, np.ndarray]:
+    x_coords = (np.arange(width) - ppx) / fx
+    y_coords = (np.arange(height) - ppy) / fy
+
+    # The arrays are shared between all the calls, make sure no one changes them
+    x_coords.setflags(write=False)
+    y_coords.setflags(write=False)
+    return x_coords, y_coords
+
+
+def get_deprojection_coords(intrinsics: rs2.intrinsics, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deprojection is done with the pinhole model: x = (j - ppx) * z / fx, y = (i - ppy) * z / fy, so the deprojected
+    point of pixel (i, j) with depth z is (x_coords[j] * z, y_coords[i] * z, z).
+    The coordinates are calculated once per camera and cached.
+    Note: The distortion of the camera is ignored, like the 'none' distortion model.
+    :param intrinsics: The intrinsics of the camera that captured the frame
+    :param shape: The shape of the frame (height, width)
+    :return: The x_coords, y_coords lookup tables
+    """
+    return _deprojection_coords(intrinsics.fx, intrinsics.fy, intrinsics.ppx, intrinsics.ppy, shape[1], shape[0])
+
+
 def find_edge_mean(frame: np.ndarray, edge: str, intrinsics: rs2.intrinsics) -> float:
     """
 
@@ -77,38 +103,35 @@ def find_edge_mean(frame: np.ndarray, edge: str, intrinsics: rs2.intrinsics) ->
     :return: The average value of that edge - right/left would give the average x value,
             Similarly up/down would give the average y value
     """
+    edges = ('right', 'left', 'up', 'down')
+    if edge not in edges:
+        raise Exception(f'\'{edge}\' is not an edge')
+
+    return edge_means(frame, intrinsics)[edges.index(edge)]
+
+
+def edge_means(frame: np.ndarray, intrinsics: rs2.intrinsics) -> Tuple[float, float, float, float]:
+    """
+    Find the average value of all the edges of a frame at once, computing the mask of the frame only once.
+    :param frame: The frame to find the edges on
+    :param intrinsics: The intrinsics of the camera that captured the frame
+    :return: The average x value of the right and left edges and the average y value of the up and down edges
+    """
     assert len(frame.shape) == 2
 
-    vals = []
-
-    if edge == 'right':
-        for i in range(frame.shape[0]):
-            for j in range(frame.shape[1]):
-                if frame[i][j] != 0:
-                    vals.append(rs2.rs2_deproject_pixel_to_point(intrinsics, [j, i], frame[i][j])[0])
-                    break
-    elif edge == 'left':
-        for i in range(frame.shape[0]):
-            for j in range(frame.shape[1] - 1, -1, -1):
-                if frame[i][j] != 0:
-                    vals.append(rs2.rs2_deproject_pixel_to_point(intrinsics, [j, i], frame[i][j])[0])
-                    break
-    elif edge == 'up':
-        for j in range(frame.shape[1]):
-            for i in range(frame.shape[0]):
-                if frame[i][j] != 0:
-                    vals.append(rs2.rs2_deproject_pixel_to_point(intrinsics, [j, i], frame[i][j])[1])
-                    break
-    elif edge == 'down':
-        for j in range(frame.shape[1]):
-            for i in range(frame.shape[0] - 1, -1, -1):
-                if frame[i][j] != 0:
-                    vals.append(rs2.rs2_deproject_pixel_to_point(intrinsics, [j, i], frame[i][j])[1])
-                    break
-    else:
-        raise Exception(f'\'{edge}\' is not an edge')
+    mask = frame != 0
+    x_coords, y_coords = get_deprojection_coords(intrinsics, frame.shape)
+
+    rows = np.nonzero(mask.any(axis=1))[0]
+    right = mask.argmax(axis=1)[rows]
+    left = frame.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)[rows]
+
+    cols = np.nonzero(mask.any(axis=0))[0]
+    up = mask.argmax(axis=0)[cols]
+    down = frame.shape[0] - 1 - mask[::-1, :].argmax(axis=0)[cols]
 
-    return np.average(vals)
+    return (np.average(x_coords[right] * frame[rows, right]), np.average(x_coords[left] * frame[rows, left]),
+            np.average(y_coords[up] * frame[up, cols]), np.average(y_coords[down] * frame[down, cols]))
 
 
 def convert_pc_to_frame(pc: np.ndarray, intrinsics: rs2.intrinsics) -> np.ndarray:
@@ -121,13 +144,17 @@ def convert_pc_to_frame(pc: np.ndarray, intrinsics: rs2.intrinsics) -> np.ndarra
     assert len(pc.shape) == 2
     assert pc.shape[1] == 3
 
-    frame = np.zeros(shape=(intrinsics.width, intrinsics.height))
+    frame = np.zeros(shape=(intrinsics.height, intrinsics.width))
+
+    # Project all the points at once with the pinhole model: j = fx * x / z + ppx, i = fy * y / z + ppy
+    x, y, z = pc.T
+    # Maybe should use int(i),int(j) because of collisions
+    j = np.rint(intrinsics.fx * x / z + intrinsics.ppx).astype(np.int32)
+    i = np.rint(intrinsics.fy * y / z + intrinsics.ppy).astype(np.int32)
 
-    for (x, y, z) in pc:
-        j, i = rs2.rs2_project_point_to_pixel(intrinsics, [x, y, z])
-        # Maybe should use int(i),int(j) because of collisions
-        i, j = round(i), round(j)
-        frame[i][j] = z
+    # Drop the points that are projected outside the frame
+    mask = (i >= 0) & (i < intrinsics.height) & (j >= 0) & (j < intrinsics.width)
+    frame[i[mask], j[mask]] = z[mask]
 
     return frame
 
@@ -143,22 +170,14 @@ def average_z_frame(frame: np.ndarray, shape: str = 'flat') -> float:
     assert len(frame.shape) == 2
 
     if shape == 'flat':
-        vals = []
-        for row in frame:
-            for z in row:
-                vals.append(z)
-        return np.average(vals)
+        return np.average(frame[frame != 0])
     elif shape == 'cylinder':
-        vals = []
-        for i in range(frame.shape[0]):
-            left = right = -1
-            for j in range(frame.shape[1] / 2):
-                if frame[i][j] != 0 and left == -1:
-                    left = j
-                elif frame[i][frame.shape[1] - 1 - j] != 0 and right == -1:
-                    right = j
-            vals.append(frame[i][(left + right) / 2])
-        return np.average(vals)
+        # Take the middle pixel between the left and right edges of each row
+        mask = frame != 0
+        rows = np.nonzero(mask.any(axis=1))[0]
+        left = mask.argmax(axis=1)[rows]
+        right = frame.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)[rows]
+        return np.average(frame[rows, (left + right) // 2])
     else:
         raise Exception(f'\'{shape}\' is not a shape')
 
@@ -176,9 +195,8 @@ def generate_frame_flat_surface(width: float, height: float, distance: float, in
 
     max_j, max_i = rs2.rs2_project_point_to_pixel(intrinsics, [width / 2, height / 2, distance])
     max_i, max_j = int(min(max_i, intrinsics.height)), int(min(max_j, intrinsics.width))
-    for i in range(intrinsics.height - max_i, max_i):
-        for j in range(intrinsics.width - max_j, max_j):
-            frame[i][j] = distance
+    min_i, min_j = max(intrinsics.height - max_i, 0), max(intrinsics.width - max_j, 0)
+    frame[min_i:max_i, min_j:max_j] = distance
     return frame
 
 
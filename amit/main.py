@@ -1,7 +1,7 @@
 import functools
 import json
 import multiprocessing as mp
-from math import cos, radians, sin, atan
+from math import cos, radians, sin
 from typing import List, Iterable, Tuple, Callable, Dict, Any
 
 import numpy as np
@@ -48,20 +48,20 @@ def apply_filters(frames: Iterable[rs2.depth_frame], filters: Iterable[rs2.filte
 
     frame: rs2.frame = frames[0]
 
+    # The same filter chain is applied to every frame, so make sure it can be iterated more than once
+    filters = list(filters)
     for frame in frames:
-        for fil in filters:
-            frame = fil.process(frame)
+        frame = utils.apply_filters(frame, filters)
 
-    for fil in after_filter:
-        frame = fil.process(frame)
-
-    return frame
+    return utils.apply_filters(frame, after_filter)
 
 
 def change_coordinates_inplace(points: np.ndarray,
                                f: Callable[[Tuple[float, float, float]], Tuple[float, float, float]]) -> None:
     """
     Change the coordinates of every point inplace via a function that returns the new coordinate of each point.
+    Note: The function is called once per point in python, so this is slow for big point clouds - prefer a
+    vectorized numpy operation (e.g invert_and_shift_z) when possible.
     :param points: The point cloud to change the coordinates of
     :param f: The function that the coordinates will change by
     :return: None
@@ -79,11 +79,12 @@ def change_coordinates_inplace(points: np.ndarray,
 def rotate_point_cloud_inplace(points: np.ndarray, angle: float) -> None:
     """
     Rotate a given point cloud around the y axis with a given angle inplace.
-    The way to rotate a vertex is with matrix multiplication of (4x4) * (4x1) = (4x1):
-    (cos(alpha)   0   -sin(alpha) 0) * (x) = (new x)
-    (0            1   0           0) * (y) = (new y)
-    (sin(alpha)   0   cos(alpha)  0) * (z) = (new z)
-    (0            0   0           1) * (1) = (1    )
+    The way to rotate a vertex is with matrix multiplication of (3x3) * (3x1) = (3x1):
+    (cos(alpha)   0   -sin(alpha)) * (x) = (new x)
+    (0            1   0          ) * (y) = (new y)
+    (sin(alpha)   0   cos(alpha) ) * (z) = (new z)
+    The y value does not change, so only the x and z columns are calculated (and there is no translation so there is
+    no need for homogeneous coordinates).
     :param points: The point cloud to rotate
     :param angle: The angle, in degrees, to rotate the point cloud around the y axis
     """
@@ -91,23 +92,12 @@ def rotate_point_cloud_inplace(points: np.ndarray, angle: float) -> None:
     assert len(points.shape) == 2
     assert points.shape[1] == 3
 
-    # Create the left matrix in the multiplication
-    rotate_matrix = np.array(
-        [[cos(radians(angle)), 0, -sin(radians(angle)), 0],
-         [0, 1, 0, 0],
-         [sin(radians(angle)), 0, cos(radians(angle)), 0],
-         [0, 0, 0, 1]])
-
-    for i, (x, y, z) in enumerate(points):
-        # Create an extended vector to perform the matrix multiplication
-        ext_vec = np.array([[x], [y], [z], [1]])
-
-        # Multiply the matrices (rotate the vertex)
-        res_vec = np.dot(rotate_matrix, ext_vec)
+    c, s = cos(radians(angle)), sin(radians(angle))
 
-        # Assign the result
-        for j in range(points.shape[1]):
-            points[i][j] = res_vec[j]
+    # Rotate all the vertices at once, x is copied since it is overwritten before calculating the new z
+    x = points[:, 0].copy()
+    points[:, 0] = c * x - s * points[:, 2]
+    points[:, 2] = s * x + c * points[:, 2]
 
 
 def filter_points(points: np.ndarray, pred: Callable[[Tuple[float, float, float]], bool]):
@@ -152,41 +142,41 @@ def generate_adapted_point_cloud(camera_map: Dict[str, Any], software_map: Dict[
     frames = capture_frames(config, software_map['frames'], software_map['dummy_frames'])
     frame = apply_filters(frames, filters, after_filters)
 
-    pc: rs2.pointcloud = rs2.pointcloud()
-    points: np.ndarray = np.array(pc.calculate(frame).get_vertices())
+    points: np.ndarray = utils.calculate_points(frame)
 
     # The deviation of the camera
     dx = 0 if 'dx' not in camera_map else camera_map['dx']
     dy = 0 if 'dy' not in camera_map else camera_map['dy']
     dz = 0 if 'dz' not in camera_map else camera_map['dz']
 
-    # Convert to viable np.ndarray, and also filter 'zero' points and accounts for deviation
-    points = np.array([(x + dx, y + dy, z + dz) for (x, y, z) in points if not x == y == z == 0])
+    # Filter 'zero' points and accounts for deviation
+    points = points[np.any(points != 0, axis=1)]
+    points += (dx, dy, dz)
 
     # Invert x, y axis and mirror the z axis around the distance line (Can add deviation adjustment)
-    change_coordinates_inplace(points,
-                               lambda p: (-p[0], -p[1], camera_map['distance'] - p[2]))
-
-    # A predicate to filter points in the cross section of 2 cameras.
-    # If it is in the cross section the predicate returns True.
-    cross_section_predicate = lambda p: not -60 < atan(p[2] / p[0]) < 60
+    utils.invert_and_shift_z(points, camera_map['distance'])
 
-    points = filter_points(points, cross_section_predicate)
     rotate_point_cloud_inplace(points, camera_map['angle'])
     return points
 
 
-def save_file(points: np.ndarray, filename: str, strategy: str = 'bpa') -> None:
+def save_file(points: np.ndarray, filename: str, strategy: str = 'bpa',
+              voxel_size: float = utils.DEFAULT_VOXEL_SIZE) -> None:
     """
     Save a point cloud to a file
     :param points: The point cloud to save to a file
     :param filename:The filename
+    :param strategy: The strategy to convert the point cloud to a triangle mesh (bpa, poisson)
+    :param voxel_size: The size of the voxels, in meters, to downsample the point cloud with before meshing it
+            (0 to not downsample)
     :return: None
     """
 
     o3d_pc = o3d.geometry.PointCloud()
 
-    o3d_pc.points = o3d.utility.Vector3dVector(points)
+    o3d_pc.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+    if voxel_size > 0:
+        o3d_pc = o3d_pc.voxel_down_sample(voxel_size)
     o3d_pc.estimate_normals()
 
     if strategy == 'bpa':
@@ -215,16 +205,22 @@ if __name__ == '__main__':
 
     cams = cfg_map['cameras']
 
+    voxel_size = utils.DEFAULT_VOXEL_SIZE if 'voxel_size' not in cfg_map['software'] else \
+        cfg_map['software']['voxel_size']
+    pcs: List[np.ndarray] = []
+
     # Using processes means effectively side-stepping the Global Interpreter Lock
     with mp.Pool(processes=len(cams)) as pool:
         gen_pc = functools.partial(generate_adapted_point_cloud, software_map=cfg_map['software'],
                                    hardware_map=cfg_map['hardware'])
-        pcs: List[np.ndarray] = pool.map(gen_pc, cams)
 
-    if cfg_map['software']['debug']:
-        for i in range(len(pcs)):
-            save_file(pcs[i], cfg_map['software']['filename'][:-4] + '_' + str(cams[i]['angle']) + '.stl')
+        # Handle each point cloud as soon as it is ready, while the next cameras are still being processed
+        for i, pc in enumerate(pool.imap(gen_pc, cams)):
+            if cfg_map['software']['debug']:
+                save_file(pc, cfg_map['software']['filename'][:-4] + '_' + str(cams[i]['angle']) + '.stl',
+                          voxel_size=voxel_size)
+            pcs.append(pc)
 
-    save_file(np.concatenate(pcs), cfg_map['software']['filename'], cfg_map['software']['strategy'])
+    save_file(np.concatenate(pcs), cfg_map['software']['filename'], cfg_map['software']['strategy'], voxel_size)
 
 # TODO: Add debug mode/logging option
@@ -21,7 +21,7 @@ def scan(config_name: str):
     with open(config_name) as f:
         d = Data.load_json(f)
 
-    utils.save_file(d.scan_object(), d.filename)
+    utils.save_file(d.scan_object(), d.filename, d.voxel_size)
 
 
 if __name__ == '__main__':
@@ -1,42 +1,68 @@
+import functools
 from math import cos, radians, sin
-from typing import List, Any, Callable, Tuple
+from typing import List, Any, Callable, Tuple, Iterable
 
 import numpy as np
 import open3d as o3d
 import pyrealsense2 as rs2
 
 
+# The default voxel size, in meters, to downsample a point cloud with before meshing it (0 means no downsampling)
+DEFAULT_VOXEL_SIZE = 0
+
+_FILTERS = {
+    'decimation_filter': rs2.decimation_filter,
+    'threshold_filter': rs2.threshold_filter,
+    'disparity_transform': rs2.disparity_transform,
+    'spatial_filter': rs2.spatial_filter,
+    'temporal_filter': rs2.temporal_filter,
+    'hole_filling_filter': rs2.hole_filling_filter,
+}
+
+
 def get_filter(filter_name: str, *args) -> rs2.filter_interface:
     """
-    Basically a factory for filters (Maybe change to Dict 'cause OOP)
+    Basically a factory for filters
     :param filter_name: The filter name
     :param args: The arguments for the filter
     :return: A filter which corresponds to the filter name with it's arguments
     """
-    if filter_name == 'decimation_filter':
-        return rs2.decimation_filter(*args)
-    elif filter_name == 'threshold_filter':
-        return rs2.threshold_filter(*args)
-    elif filter_name == 'disparity_transform':
-        return rs2.disparity_transform(*args)
-    elif filter_name == 'spatial_filter':
-        return rs2.spatial_filter(*args)
-    elif filter_name == 'temporal_filter':
-        return rs2.temporal_filter(*args)
-    elif filter_name == 'hole_filling_filter':
-        return rs2.hole_filling_filter(*args)
-    else:
+    filter_class = _FILTERS.get(filter_name)
+    if filter_class is None:
         raise Exception(f'The filter \'{filter_name}\' does not exist!')
+    return filter_class(*args)
 
 
 def get_filters(filters_name_args: List[List[Any]]) -> List[rs2.filter_interface]:
     return [get_filter(filter_name, *args) for (filter_name, *args) in filters_name_args]
 
 
+def apply_filters(frame: rs2.frame, filters: Iterable[rs2.filter]) -> rs2.frame:
+    """
+    Pass a frame through a chain of filters.
+    :param frame: The frame to filter
+    :param filters: The filters to apply, in order
+    :return: The frame after applying all the filters
+    """
+    return functools.reduce(lambda f, fil: fil.process(f), filters, frame)
+
+
+def calculate_points(frame: rs2.frame) -> np.ndarray:
+    """
+    Calculate the point cloud of a depth frame.
+    :param frame: The depth frame to calculate the point cloud from
+    :return: The vertices of the point cloud as a (N, 3) float32 array, viewing the SDK buffer without copying it
+    """
+    pc: rs2.pointcloud = rs2.pointcloud()
+    return np.asanyarray(pc.calculate(frame).get_vertices(2))
+
+
 def change_coordinates_inplace(points: np.ndarray,
                                f: Callable[[Tuple[float, float, float]], Tuple[float, float, float]]) -> None:
     """
     Change the coordinates of every point inplace via a function that returns the new coordinate of each point.
+    Note: The function is called once per point in python, so this is slow for big point clouds - prefer a
+    vectorized numpy operation (e.g invert_and_shift_z) when possible.
     :param points: The point cloud to change the coordinates of
     :param f: The function that the coordinates will change by
     :return: None
@@ -51,6 +77,23 @@ def change_coordinates_inplace(points: np.ndarray,
             points[i][j] = res_point[j]
 
 
+def invert_and_shift_z(points: np.ndarray, distance: float) -> None:
+    """
+    Invert the x, y axis and mirror the z axis around the distance line inplace:
+    (x, y, z) -> (-x, -y, distance - z)
+    :param points: The point cloud to change the coordinates of
+    :param distance: The distance to mirror the z axis around
+    :return: None
+    """
+
+    assert len(points.shape) == 2
+    assert points.shape[1] == 3
+
+    points[:, 0] *= -1
+    points[:, 1] *= -1
+    np.subtract(distance, points[:, 2], out=points[:, 2])
+
+
 def filter_points(points: np.ndarray, pred: Callable[[Tuple[float, float, float]], bool]):
     """
 
@@ -70,14 +113,39 @@ def filter_points(points: np.ndarray, pred: Callable[[Tuple[float, float, float]
     return np.delete(points, del_idx, axis=0)
 
 
+def angle_limit(points: np.ndarray, left_horizontal_bound: float = -180, right_horizontal_bound: float = 180,
+                bottom_vertical_bound: float = -180, top_vertical_bound: float = 180) -> np.ndarray:
+    """
+    Keep only the points which are inside the given angles, as seen from the middle point looking at the z axis.
+    The horizontal angle is the angle between the z axis and the x axis, the vertical angle is between the z axis and
+    the y axis.
+    :param points: The point cloud to filter points from
+    :param left_horizontal_bound: The minimal horizontal angle, in degrees
+    :param right_horizontal_bound: The maximal horizontal angle, in degrees
+    :param bottom_vertical_bound: The minimal vertical angle, in degrees
+    :param top_vertical_bound: The maximal vertical angle, in degrees
+    :return: A new point cloud without the points outside the angles
+    """
+    assert len(points.shape) == 2
+    assert points.shape[1] == 3
+
+    # Convert the bounds to radians instead of converting the angle of every point to degrees
+    hor = np.arctan2(points[:, 0], points[:, 2])
+    ver = np.arctan2(points[:, 1], points[:, 2])
+
+    return points[(hor >= radians(left_horizontal_bound)) & (hor <= radians(right_horizontal_bound)) &
+                  (ver >= radians(bottom_vertical_bound)) & (ver <= radians(top_vertical_bound))]
+
+
 def rotate_point_cloud_inplace(points: np.ndarray, angle: float) -> None:
     """
     Rotate a given point cloud around the y axis with a given angle inplace.
-    The way to rotate a vertex is with matrix multiplication of (4x4) * (4x1) = (4x1):
-    (cos(alpha)   0   -sin(alpha) 0) * (x) = (new x)
-    (0            1   0           0) * (y) = (new y)
-    (sin(alpha)   0   cos(alpha)  0) * (z) = (new z)
-    (0            0   0           1) * (1) = (1    )
+    The way to rotate a vertex is with matrix multiplication of (3x3) * (3x1) = (3x1):
+    (cos(alpha)   0   -sin(alpha)) * (x) = (new x)
+    (0            1   0          ) * (y) = (new y)
+    (sin(alpha)   0   cos(alpha) ) * (z) = (new z)
+    The y value does not change, so only the x and z columns are calculated (and there is no translation so there is
+    no need for homogeneous coordinates).
     :param points: The point cloud to rotate
     :param angle: The angle, in degrees, to rotate the point cloud around the y axis
     """
@@ -85,36 +153,29 @@ def rotate_point_cloud_inplace(points: np.ndarray, angle: float) -> None:
     assert len(points.shape) == 2
     assert points.shape[1] == 3
 
-    # Create the left matrix in the multiplication
-    rotate_matrix = np.array(
-        [[cos(radians(angle)), 0, -sin(radians(angle)), 0],
-         [0, 1, 0, 0],
-         [sin(radians(angle)), 0, cos(radians(angle)), 0],
-         [0, 0, 0, 1]])
-
-    for i, (x, y, z) in enumerate(points):
-        # Create an extended vector to perform the matrix multiplication
-        ext_vec = np.array([[x], [y], [z], [1]])
+    c, s = cos(radians(angle)), sin(radians(angle))
 
-        # Multiply the matrices (rotate the vertex)
-        res_vec = np.dot(rotate_matrix, ext_vec)
-
-        # Assign the result
-        for j in range(points.shape[1]):
-            points[i][j] = res_vec[j]
+    # Rotate all the vertices at once, x is copied since it is overwritten before calculating the new z
+    x = points[:, 0].copy()
+    points[:, 0] = c * x - s * points[:, 2]
+    points[:, 2] = s * x + c * points[:, 2]
 
 
-def save_file(points: np.ndarray, filename: str) -> None:
+def save_file(points: np.ndarray, filename: str, voxel_size: float = DEFAULT_VOXEL_SIZE) -> None:
     """
     Save a point cloud to a file
     :param points: The point cloud to save to a file
     :param filename:The filename
+    :param voxel_size: The size of the voxels, in meters, to downsample the point cloud with before meshing it
+            (0 to not downsample)
     :return: None
     """
 
     o3d_pc = o3d.geometry.PointCloud()
 
-    o3d_pc.points = o3d.utility.Vector3dVector(points)
+    o3d_pc.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+    if voxel_size > 0:
+        o3d_pc = o3d_pc.voxel_down_sample(voxel_size)
     o3d_pc.estimate_normals()
 
     distances = o3d_pc.compute_nearest_neighbor_distance()
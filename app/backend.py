@@ -9,7 +9,7 @@ from amit import utils
 
 def capture(entries, d: Data, listener=None):
     filename = entries['file_name'].get() + entries['file_type'].get()
-    utils.save_file(d.scan_object(), filename)
+    utils.save_file(d.scan_object(), filename, d.voxel_size)
 
     print("implemented\tcapture", filename)
 